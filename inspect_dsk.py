@@ -1,6 +1,8 @@
-import struct
 import sys
 
+# High bit is set on filename characters
+FILENAME_TABLE = bytes(b & 0x7F for b in range(256))
+
 def read_sector(f, track, sector):
     offset = (track * 16 + sector) * 256
     f.seek(offset)
@@ -38,11 +40,10 @@ def parse_dsk(filename):
                     continue # Deleted or empty
                 
                 filename_raw = entry[3:33]
-                # High bit is set on characters
-                filename_str = "".join([chr(b & 0x7F) for b in filename_raw if b != 0]).strip()
+                filename_str = filename_raw.translate(FILENAME_TABLE).rstrip(b' \x00').decode('ascii')
                 
                 file_type = entry[2] & 0x7F
-                file_len = struct.unpack('<H', entry[33:35])[0]
+                file_len = entry[33] | (entry[34] << 8)
                 
                 print(f"File: {filename_str}, Type: {file_type:02X}, Len: {file_len}")
                 files.append(filename_str)
@@ -6,9 +6,12 @@ Read-only FUSE filesystem for Apple DOS 3.3 disk images (.dsk, .do formats)
 
 import os
 import sys
+import mmap
 import errno
-import struct
+import threading
+from array import array
 import ctypes.util
+from collections import OrderedDict
 
 # Monkeypatch find_library to support fuse-t on macOS
 _original_find_library = ctypes.util.find_library
@@ -24,32 +27,68 @@ ctypes.util.find_library = _find_library
 
 from fuse import FUSE, FuseOSError, Operations
 
+# 35 tracks x 16 sectors x 256 bytes
+DISK_SIZE = 35 * 16 * 256
+
+# Strips the high bit DOS 3.3 sets on filename characters
+_FILENAME_TABLE = bytes(b & 0x7F for b in range(256))
+
+# Offsets of the 7 35-byte file entries within a catalog sector
+_CATALOG_ENTRY_OFFSETS = tuple(range(11, 11 + 7 * 35, 35))
+
+# Default byte budget for cached file contents
+DEFAULT_CACHE_SIZE = 64 * 1024
+
 
 class AppleDOS33FS(Operations):
     """FUSE filesystem for Apple DOS 3.3 disk images"""
 
-    def __init__(self, dsk_path):
+    def __init__(self, dsk_path, cache_size=DEFAULT_CACHE_SIZE):
         self.dsk_path = dsk_path
-        self.fd = open(dsk_path, 'rb')
-        self.files = {}  # filename -> {type, len, ts_track, ts_sector}
-        self._file_cache = {}  # Cache file data for performance
+        # Map the whole image once; the mapping keeps its own handle, so
+        # the file object is not needed after this
+        with open(dsk_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < DISK_SIZE:
+            size = len(self.mm)
+            self.mm.close()
+            raise ValueError(f"Disk image too small: {size} bytes, expected {DISK_SIZE}")
+        # The image is small, so have the kernel read it all in up front
+        # rather than faulting pages in one sector at a time
+        if hasattr(mmap, 'MADV_WILLNEED'):
+            self.mm.madvise(mmap.MADV_WILLNEED)
+        # Slicing a memoryview yields views into the mapping instead of
+        # copying each sector out into a new bytes object
+        self.image = memoryview(self.mm)
+        # Catalog stored as parallel arrays, one slot per file
+        self.names = []
+        self.name_to_index = {}  # filename -> slot
+        self.types = array('B')
+        self.lengths = array('H')  # Length in sectors
+        self.ts_tracks = array('B')
+        self.ts_sectors = array('B')
+        self.cache_size = cache_size
+        self._file_cache = OrderedDict()  # LRU cache: filename -> file data
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        # filename -> image offsets of data sectors. Entries are only ever
+        # assigned whole, so concurrent readers at worst compute one twice
+        self._sector_offsets = {}
+        self._read_ends = {}  # filename -> end offset of the last read
         self._parse_catalog()
 
-    def _read_sector(self, track, sector):
-        """Read a 256-byte sector from the disk image"""
-        if track < 0 or track >= 35:
-            raise ValueError(f"Invalid track: {track}")
-        if sector < 0 or sector >= 16:
-            raise ValueError(f"Invalid sector: {sector}")
-
-        offset = (track * 16 + sector) * 256
-        self.fd.seek(offset)
-        data = self.fd.read(256)
+    def _sector_offset(self, track, sector):
+        """Byte offset of a sector within the disk image"""
+        # Callers pass byte values read from the image, so only the upper
+        # bounds can be wrong; checked only when not running with -O
+        assert track < 35 and sector < 16, f"Invalid sector T{track}S{sector}"
 
-        if len(data) != 256:
-            raise IOError(f"Failed to read full sector T{track}S{sector}: got {len(data)} bytes")
+        return (track * 16 + sector) * 256
 
-        return data
+    def _read_sector(self, track, sector):
+        """Return a 256-byte view of a sector in the disk image"""
+        offset = self._sector_offset(track, sector)
+        return self.image[offset:offset + 256]
 
     def _parse_catalog(self):
         """Parse the DOS 3.3 catalog to build file directory"""
@@ -77,72 +116,124 @@ class AppleDOS33FS(Operations):
             next_sector = sector_data[2]
 
             # Each catalog sector contains up to 7 file entries
-            for i in range(7):
-                offset = 11 + (i * 35)
+            for offset in _CATALOG_ENTRY_OFFSETS:
                 entry = sector_data[offset:offset+35]
 
                 ts_track = entry[0]
                 if ts_track == 0 or ts_track == 0xFF:
                     continue
 
-                # Extract filename (30 bytes, high bit set)
-                filename_raw = entry[3:33]
-                filename = "".join([chr(b & 0x7F) for b in filename_raw if b != 0]).strip()
+                # Extract filename (30 bytes, high bit set, padded with spaces)
+                filename_raw = entry[3:33].tobytes()
+                filename = filename_raw.translate(_FILENAME_TABLE).rstrip(b' \x00').decode('ascii')
 
                 file_type = entry[2] & 0x7F
-                file_len = struct.unpack('<H', entry[33:35])[0]  # Length in sectors
+                file_len = entry[33] | (entry[34] << 8)  # Length in sectors
 
                 # Handle duplicate filenames if necessary (DOS 3.3 allows them)
                 # For now, last one wins
-                self.files[filename] = {
-                    'type': file_type,
-                    'len_sectors': file_len,
-                    'ts_track': ts_track,
-                    'ts_sector': entry[1]
-                }
+                index = self.name_to_index.get(filename)
+                if index is None:
+                    self.name_to_index[filename] = len(self.names)
+                    self.names.append(filename)
+                    self.types.append(file_type)
+                    self.lengths.append(file_len)
+                    self.ts_tracks.append(ts_track)
+                    self.ts_sectors.append(entry[1])
+                else:
+                    self.types[index] = file_type
+                    self.lengths[index] = file_len
+                    self.ts_tracks[index] = ts_track
+                    self.ts_sectors[index] = entry[1]
 
             current_track = next_track
             current_sector = next_sector
 
-    def _read_file_data(self, filename):
-        """Read complete file data by following T/S list chain"""
-        if filename not in self.files:
-            return b''
-
-        # Check cache first
-        if filename in self._file_cache:
-            return self._file_cache[filename]
+    def _get_sector_offsets(self, filename):
+        """Image offsets of a file's data sectors, following T/S list chain"""
+        offsets = self._sector_offsets.get(filename)
+        if offsets is not None:
+            return offsets
 
-        file_entry = self.files[filename]
-        data = bytearray()
+        index = self.name_to_index[filename]
+        offsets = []
 
-        ts_track = file_entry['ts_track']
-        ts_sector = file_entry['ts_sector']
+        ts_track = self.ts_tracks[index]
+        ts_sector = self.ts_sectors[index]
 
         # Follow T/S list chain
         while ts_track != 0:
             ts_list = self._read_sector(ts_track, ts_sector)
 
-            # Each TS list sector has up to 122 track/sector pairs
-            for i in range(122):
-                offset = 12 + (i * 2)
-                track = ts_list[offset]
-                sector = ts_list[offset + 1]
+            # Each TS list sector has up to 122 track/sector pairs; split
+            # them into track and sector columns so the scan for the end of
+            # the list and the bounds check run in C rather than per pair
+            tracks = ts_list[12:256:2].tobytes()
+            sectors = ts_list[13:256:2].tobytes()
+
+            end = tracks.find(0)
+            if end != -1:
+                # End of data in this T/S list
+                tracks = tracks[:end]
+                sectors = sectors[:end]
 
-                if track == 0:
-                    # End of data in this T/S list
-                    break
+            if tracks and (max(tracks) >= 35 or max(sectors) >= 16):
+                raise ValueError(f"Invalid data sector in T/S list T{ts_track}S{ts_sector}")
 
-                data.extend(self._read_sector(track, sector))
+            offsets.extend([(t * 16 + s) * 256 for t, s in zip(tracks, sectors)])
 
             # Next T/S list sector in chain
             ts_track = ts_list[1]
             ts_sector = ts_list[2]
 
-        result = bytes(data)
-        self._file_cache[filename] = result
+        self._sector_offsets[filename] = offsets
+        return offsets
+
+    def _read_sectors(self, offsets):
+        """Join the 256-byte sectors at the given image offsets"""
+        image = self.image
+        return b''.join([image[o:o + 256] for o in offsets])
+
+    def _read_file_data(self, filename):
+        """Read complete file data"""
+        if filename not in self.name_to_index:
+            return b''
+
+        # Check cache first
+        cached = self._get_cached_file_data(filename)
+        if cached is not None:
+            return cached
+
+        result = self._read_sectors(self._get_sector_offsets(filename))
+        self._cache_file_data(filename, result)
         return result
 
+    def _get_cached_file_data(self, filename):
+        """Return cached file data (marking it recently used), or None"""
+        with self._cache_lock:
+            cached = self._file_cache.get(filename)
+            if cached is not None:
+                self._file_cache.move_to_end(filename)
+            return cached
+
+    def _cache_file_data(self, filename, data):
+        """Cache file data, evicting least recently used files over budget"""
+        if len(data) > self.cache_size:
+            return
+
+        with self._cache_lock:
+            previous = self._file_cache.pop(filename, None)
+            if previous is not None:
+                # Another thread cached this file while we were reading it
+                self._cache_bytes -= len(previous)
+
+            self._file_cache[filename] = data
+            self._cache_bytes += len(data)
+
+            while self._cache_bytes > self.cache_size:
+                _, evicted = self._file_cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
     # FUSE Operations
     # ===============
 
@@ -151,34 +242,66 @@ class AppleDOS33FS(Operations):
         if path == '/':
             return dict(st_mode=(0o40755), st_nlink=2)
 
-        filename = path[1:]  # strip leading /
-        if filename in self.files:
+        index = self.name_to_index.get(path[1:])  # strip leading /
+        if index is not None:
             # Return actual file size (sectors * 256)
             # Note: Some file types have size metadata in their headers,
             # but for simplicity we report the full sector allocation
-            st_size = self.files[filename]['len_sectors'] * 256
+            st_size = self.lengths[index] * 256
             return dict(st_mode=(0o100444), st_nlink=1, st_size=st_size)
 
         raise FuseOSError(errno.ENOENT)
 
     def readdir(self, path, fh):
         """List directory contents"""
-        return ['.', '..'] + list(self.files.keys())
+        return ['.', '..'] + self.names
 
     def read(self, path, length, offset, fh):
         """Read data from file"""
         filename = path[1:]
-        if filename not in self.files:
+        if filename not in self.name_to_index:
             raise FuseOSError(errno.ENOENT)
 
-        # Read file data (cached after first read)
-        data = self._read_file_data(filename)
-        return data[offset:offset + length]
+        offsets = self._get_sector_offsets(filename)
+        size = len(offsets) * 256
+
+        if offset == 0 and length >= size:
+            # Whole file requested (cached after first read)
+            return self._read_file_data(filename)
+
+        if offset >= size:
+            return b''
+
+        # A read picking up where the previous one ended means the file is
+        # being streamed, so materialize all of it now and serve the rest of
+        # the chunks as slices of the cached copy
+        sequential = self._read_ends.get(filename) == offset
+        self._read_ends[filename] = offset + length
+
+        if sequential and size <= self.cache_size:
+            data = self._read_file_data(filename)
+        else:
+            data = self._get_cached_file_data(filename)
+        if data is not None:
+            return data[offset:offset + length]
+
+        # Only gather the sectors covering the requested range
+        first = offset // 256
+        last = (min(offset + length, size) + 255) // 256
+        data = self._read_sectors(offsets[first:last])
+
+        # fusepy copies the result out with ctypes.memmove, which only accepts
+        # bytes-like objects it can take a pointer to (not memoryview), so a
+        # bytes slice is already the single unavoidable copy
+        start = offset - first * 256
+        return data[start:start + length]
 
     def destroy(self, path):
         """Clean up resources when unmounting"""
-        if self.fd:
-            self.fd.close()
+        if self.mm:
+            # The view must be released before the mapping can be closed
+            self.image.release()
+            self.mm.close()
 
 
 def mount(image_path: str, mount_point: str, foreground: bool = True):
@@ -186,8 +309,16 @@ def mount(image_path: str, mount_point: str, foreground: bool = True):
     if not os.path.exists(mount_point):
         os.makedirs(mount_point)
 
+    options = {}
+    if sys.platform.startswith('linux'):
+        # Larger kernel requests mean fewer round trips into Python per file,
+        # and since the image never changes the page cache can be kept
+        # across opens
+        options.update(max_read=1024 * 1024, max_readahead=128 * 1024,
+                       kernel_cache=True)
+
     filesystem = AppleDOS33FS(image_path)
-    FUSE(filesystem, mount_point, nothreads=True, foreground=foreground)
+    FUSE(filesystem, mount_point, foreground=foreground, **options)
 
 
 def main():